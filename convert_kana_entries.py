@@ -0,0 +1,474 @@
+"""
+convert_kana_entries.py
+
+Lightweight implementation to:
+- Parse a fixed numbered file of entries (lines like "1. kanji, kana, meaning")
+- Build simple pools for distractors
+- Generate multiple-choice questions (one per entry: kana -> meaning)
+- Create an SQLite DB and insert `entries` and `questions` tables/rows
+
+This module exposes the functions expected by `process_mimikara_n3.py`:
+- parse_fixed_file(path: Path) -> List[Tuple[str,str,str]]
+- build_pools(entries) -> (kanji_pool, kana_pool, meaning_pool)
+- generate_all_questions(entries, kanji_pool, kana_pool, meaning_pool) -> (questions, skipped)
+- create_db(db_path: Path, force: bool) -> sqlite3.Connection
+- insert_entries(conn, entries) -> List[int]  # list of inserted entry ids
+- insert_questions(conn, questions, entry_db_ids) -> int  # number inserted
+
+Notes:
+- Questions generated: prompt is the `kana` and the question asks for the meaning.
+- Options are a list of 4 strings: one correct meaning and up to 3 distractors sampled
+  from other meanings in the pool. If not enough distractors found, the question is skipped.
+- The DB schema is conservative and compatible with the backend init:
+  tables created: entries, questions (superset), n_level (not populated here),
+  tests, quizzes (if not exist). This function will not drop tables unless `force` is True.
+"""
+from __future__ import annotations
+
+import json
+import random
+import sqlite3
+
+# prefer google-re2 when available: it compiles patterns to a DFA, so
+# bulk re-ingestion scans at memory bandwidth instead of backtracking
+try:
+    import re2 as _re
+except ImportError:
+    import re as _re
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+# numbered entry lines in the fixed file: "12.   kanji, kana, meaning,"
+_ENTRY_LINE_RE = _re.compile(r"^\s*(\d+)\.\s*([^\n]*)", _re.MULTILINE)
+_ENTRY_LINE_BYTES_RE = _re.compile(rb"^\s*(\d+)\.\s*([^\n]*)", _re.MULTILINE)
+
+# above this size, scan the raw bytes and decode only the matched fields
+# instead of decoding the whole file into (up to 4-byte/char) str storage
+_BYTES_SCAN_THRESHOLD = 64 * 1024 * 1024
+
+# (entry_index, q_type, prompt, text, correct_answer, options, correct_index)
+QuestionRow = Tuple[int, str, str, str, str, List[str], int]
+
+# One row per question direction: (q_type, prompt column, answer column,
+# distractor pool, text template). Columns index (kanji, kana, meaning).
+_QUESTION_SPECS = (
+    ("kanji_to_hiragana", 0, 1, "kana", "What is the hiragana reading of '%s'?"),
+    ("kanji_to_meaning", 0, 2, "meaning", "What does '%s' mean?"),
+    ("kana_to_meaning", 1, 2, "meaning", "What does '%s' mean?"),
+    ("kana_to_kanji", 1, 0, "kanji", "Which kanji corresponds to '%s'?"),
+    ("meaning_to_kanji", 2, 0, "kanji", "Which kanji represents '%s'?"),
+    ("meaning_to_kana", 2, 1, "kana", "What is the hiragana for '%s'?"),
+)
+
+# full DDL in one script so create_db makes a single C-level trip;
+# quizzes/n_level/tests are owned by the backend and chapter pipeline
+_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    list_index INTEGER,
+    kanji TEXT,
+    kana TEXT,
+    meaning TEXT
+);
+
+CREATE TABLE IF NOT EXISTS quizzes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    description TEXT,
+    created_at TEXT DEFAULT (datetime('now'))
+);
+
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    entry_id INTEGER,
+    quiz_id INTEGER,
+    q_type TEXT,
+    prompt TEXT,
+    text TEXT,
+    options TEXT,
+    correct_answer TEXT,
+    correct_index INTEGER,
+    level INTEGER,
+    chapter INTEGER,
+    created_at TEXT DEFAULT (datetime('now'))
+);
+
+CREATE TABLE IF NOT EXISTS n_level (
+    id INTEGER PRIMARY KEY,
+    level TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS tests (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT,
+    questions TEXT,
+    created_at TEXT DEFAULT (datetime('now'))
+);
+"""
+
+
+def parse_fixed_file(path: Path) -> List[Tuple[str, str, str]]:
+    """Parse the fixed numbered file.
+
+    Lines look like ``12.   漢字, かな, meaning,``. Returns a list of
+    (kanji, kana, meaning) tuples with surrounding whitespace stripped.
+    Lines that do not match the numbered pattern are ignored.
+    """
+    if not path.exists():
+        raise FileNotFoundError(f"Fixed file not found: {path}")
+
+    entries = []
+    append = entries.append
+    # read the whole file once and let the regex engine find the numbered
+    # lines: one C-level scan instead of per-line Python dispatch, and
+    # blanks / headers / chapter braces are skipped for free. Large files
+    # are scanned as bytes so only the matched fields are ever decoded.
+    if path.stat().st_size >= _BYTES_SCAN_THRESHOLD:
+        buf = path.read_bytes()
+        matches = (m.group(2).decode("utf-8") for m in _ENTRY_LINE_BYTES_RE.finditer(buf))
+    else:
+        text = path.read_text(encoding="utf-8")
+        matches = (m.group(2) for m in _ENTRY_LINE_RE.finditer(text))
+    for rest in matches:
+        # at most 3 fields; the meaning may itself contain commas
+        parts = [p.strip() for p in rest.split(",", 2)]
+        # pad missing fields so unpacking below is safe
+        while len(parts) < 3:
+            parts.append("")
+        append((parts[0], parts[1], parts[2]))
+    return entries
+
+
+def build_pools(entries: List[Tuple[str, str, str]]) -> Tuple[List[str], List[str], List[str]]:
+    """Build distractor pools from the parsed entries.
+
+    Returns three lists (kanji_pool, kana_pool, meaning_pool) with
+    duplicates and empty values removed, preserving first-seen order so
+    generation stays deterministic for a given input file and seed.
+    """
+    # dicts double as insertion-ordered sets: one hash per value instead
+    # of a set membership test plus a list append
+    kanji_seen = {}
+    kana_seen = {}
+    meaning_seen = {}
+
+    for kanji, kana, meaning in entries:
+        if kanji:
+            kanji_seen[kanji] = None
+        if kana:
+            kana_seen[kana] = None
+        if meaning:
+            meaning_seen[meaning] = None
+
+    return list(kanji_seen), list(kana_seen), list(meaning_seen)
+
+
+def generate_all_questions(
+    entries: List[Tuple[str, str, str]],
+    kanji_pool: List[str],
+    kana_pool: List[str],
+    meaning_pool: List[str],
+    min_options: int = 4,
+    rng: Optional[random.Random] = None,
+) -> Tuple[List[QuestionRow], int]:
+    """Generate the full set of multiple-choice questions.
+
+    For every entry, up to six questions are produced (one per direction
+    between kanji, kana and meaning, wherever both sides are non-empty):
+    kanji->kana, kanji->meaning, kana->meaning, kana->kanji,
+    meaning->kanji and meaning->kana.
+
+    Each question is a `QuestionRow` tuple of entry_index (1-based),
+    q_type, prompt, text, correct_answer, options (list of `min_options`
+    strings in shuffled order) and correct_index.
+
+    Distractors are sampled from the respective pool; when a pool is too
+    small to provide enough distractors the question is skipped and
+    counted. The pools must already be unique and free of empty values,
+    as returned by `build_pools`.
+
+    Returns (questions, skipped).
+    """
+    if rng is None:
+        rng = random
+
+    questions = []
+    skipped = 0
+
+    # build_pools already returns unique, non-empty values (checked below
+    # in debug runs), so rebuilding the pools here is wasted O(N) work
+    if __debug__:
+        assert len(set(kanji_pool)) == len(kanji_pool)
+        assert len(set(kana_pool)) == len(kana_pool)
+        assert len(set(meaning_pool)) == len(meaning_pool)
+    # freeze the pools as tuples and index them once, so sampling can
+    # draw plain C integers and only the picked indices touch strings
+    kanji_pool_unique = tuple(kanji_pool)
+    kana_pool_unique = tuple(kana_pool)
+    meaning_pool_unique = tuple(meaning_pool)
+    kanji_positions = {s: i for i, s in enumerate(kanji_pool_unique)}
+    kana_positions = {s: i for i, s in enumerate(kana_pool_unique)}
+    meaning_positions = {s: i for i, s in enumerate(meaning_pool_unique)}
+
+    # resolve the per-direction pool names once, outside the entry loop;
+    # pool_range is None when the pool cannot cover min_options draws
+    pools = {
+        "kanji": (kanji_pool_unique, kanji_positions),
+        "kana": (kana_pool_unique, kana_positions),
+        "meaning": (meaning_pool_unique, meaning_positions),
+    }
+    specs = tuple(
+        pools[pool_name]
+        + (
+            range(len(pools[pool_name][0])) if len(pools[pool_name][0]) >= min_options else None,
+            q_type,
+            prompt_col,
+            answer_col,
+            template,
+        )
+        for q_type, prompt_col, answer_col, pool_name, template in _QUESTION_SPECS
+    )
+
+    # the loop below runs ~6x per entry; the distractor sampling is
+    # inlined and hot attribute lookups are bound to locals so each
+    # question costs no Python-level calls beyond the rng itself
+    need = min_options - 1
+    rng_sample = rng.sample
+    rng_randrange = rng.randrange
+    questions_append = questions.append
+
+    for idx, (kanji, kana, meaning) in enumerate(entries, start=1):
+        # normalize: columns may be None/empty in partially filled rows
+        vals = ((kanji or "").strip(), (kana or "").strip(), (meaning or "").strip())
+
+        for pool, positions, pool_range, q_type, prompt_col, answer_col, template in specs:
+            prompt_val = vals[prompt_col]
+            correct = vals[answer_col]
+            if not (prompt_val and correct):
+                continue
+            if pool_range is None:
+                skipped += 1
+                continue
+            # sample one extra index and drop the correct answer's slot
+            # rather than copying the whole pool into a filtered list
+            correct_i = positions.get(correct, -1)
+            idxs = rng_sample(pool_range, min_options)
+            opts = [pool[i] for i in idxs if i != correct_i]
+            if len(opts) > need:
+                opts.pop()
+            # drop the correct answer into a random slot instead of
+            # shuffling and rescanning: the distractors are already in
+            # random draw order, so one randrange gives a uniform layout
+            # and the correct index is known without an .index scan
+            pos = rng_randrange(min_options)
+            opts.insert(pos, correct)
+            questions_append(
+                (
+                    idx,
+                    q_type,
+                    prompt_val,
+                    template % prompt_val,
+                    correct,
+                    opts,
+                    pos,
+                )
+            )
+
+    return questions, skipped
+
+
+def create_db(db_path: Path, force: bool = False) -> sqlite3.Connection:
+    """Create (or open) the questions DB and make sure the schema exists.
+
+    When `force` is True an existing DB file is removed first. Returns an
+    open connection with `row_factory` set to `sqlite3.Row`.
+    """
+    db_path = Path(db_path)
+    if force and db_path.exists():
+        db_path.unlink()
+
+    # make sure the parent directory exists
+    if db_path.parent and not db_path.parent.exists():
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+
+    conn = sqlite3.connect(str(db_path))
+    conn.row_factory = sqlite3.Row
+
+    # tune for bulk loading: WAL avoids journal rewrites, NORMAL sync is
+    # plenty for a DB we can regenerate, and a large page cache plus
+    # in-memory temp store keep the inserts off the disk
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-65536")
+    conn.execute("PRAGMA mmap_size=268435456")
+
+    conn.executescript(_SCHEMA_SQL)
+    conn.commit()
+    return conn
+
+
+def finalize_db(conn: sqlite3.Connection) -> None:
+    """Create the lookup indexes. Call this after the bulk inserts:
+    building each B-tree once over sorted data is much cheaper than
+    maintaining it through every INSERT of the load.
+    """
+    conn.executescript(
+        """
+        CREATE INDEX IF NOT EXISTS idx_entries_list_index ON entries(list_index);
+        CREATE INDEX IF NOT EXISTS idx_questions_entry_id ON questions(entry_id);
+        CREATE INDEX IF NOT EXISTS idx_questions_level_chapter ON questions(level, chapter);
+        """
+    )
+
+
+def insert_entries(
+    conn: sqlite3.Connection, entries: List[Tuple[str, str, str]]
+) -> List[int]:
+    """Insert the parsed entries and return the list of their DB ids,
+    in the same order as `entries`.
+
+    Ids are assigned explicitly as one contiguous block starting after
+    any existing rows (from 1 on a fresh `create_db(force=True)` DB), so
+    no last_insert_rowid probing is needed and callers can map an entry
+    index to its row id arithmetically from the block start.
+    """
+    if not entries:
+        return []
+    # appending to a non-empty table (a run without --force) keeps the
+    # ids contiguous past the highest existing one, as AUTOINCREMENT did
+    first_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM entries").fetchone()[0] + 1
+    rows = [
+        (first_id - 1 + i, i, kanji or None, kana or None, meaning or None)
+        for i, (kanji, kana, meaning) in enumerate(entries, start=1)
+    ]
+    conn.executemany(
+        "INSERT INTO entries (id, list_index, kanji, kana, meaning) VALUES (?, ?, ?, ?, ?)",
+        rows,
+    )
+    conn.commit()
+    return list(range(first_id, first_id + len(rows)))
+
+
+def insert_questions(
+    conn: sqlite3.Connection, questions: Iterable[QuestionRow], entry_db_ids: List[int]
+) -> int:
+    """Insert generated questions. `entry_db_ids` is the contiguous id
+    block returned by `insert_entries`, so each `entry_index` maps to
+    its row id by a constant offset — no per-question list lookup. The
+    rows are streamed straight into one executemany, so `questions` may
+    be any iterable of QuestionRow tuples. Returns the number inserted.
+
+    `created_at` is left to the column's DEFAULT (datetime('now')), so
+    no timestamp is computed or bound per row.
+    """
+    json_dumps = json.dumps
+    # questions drawn from small pools often repeat the exact same
+    # options list; serialize each distinct one only once
+    options_cache = {}
+    # insert_entries returns one contiguous range, so its start is all
+    # that is needed to turn an entry index into a row id
+    id_offset = entry_db_ids[0] - 1 if entry_db_ids else 0
+    inserted = 0
+
+    def rows():
+        nonlocal inserted
+        for entry_index, q_type, prompt, text, correct_answer, options, correct_index in questions:
+            inserted += 1
+            key = tuple(options)
+            options_json = options_cache.get(key)
+            if options_json is None:
+                options_json = options_cache[key] = json_dumps(options, ensure_ascii=False)
+            yield (
+                entry_index + id_offset,
+                None,
+                q_type,
+                prompt,
+                text,
+                options_json,
+                correct_answer,
+                correct_index,
+                None,
+                None,
+            )
+
+    with conn:
+        conn.executemany(
+            """
+            INSERT INTO questions
+            (entry_id, quiz_id, q_type, prompt, text, options, correct_answer, correct_index, level, chapter)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            rows(),
+        )
+    return inserted
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Generate entries and simple MC questions into an SQLite DB from a fixed file."
+    )
+    parser.add_argument(
+        "--fixed",
+        "-f",
+        type=Path,
+        default=Path("mimikara_n3_fixed.txt"),
+        help="Fixed input file",
+    )
+    parser.add_argument(
+        "--db",
+        "-d",
+        type=Path,
+        default=Path("mimikara_n3_questions.db"),
+        help="Output DB file",
+    )
+    parser.add_argument("--force", action="store_true", help="Overwrite DB if exists")
+    parser.add_argument(
+        "--seed", type=int, default=None, help="Random seed for distractors"
+    )
+    parser.add_argument(
+        "--show-sample",
+        action="store_true",
+        help="Print a few sample questions after generation",
+    )
+
+    args = parser.parse_args()
+
+    # a private Random keeps seeding out of process-global state, so a
+    # future parallel path can hand each worker its own stream
+    rng = random.Random(args.seed)
+
+    entries = parse_fixed_file(args.fixed)
+    print(f"Parsed {len(entries)} entries from {args.fixed}")
+
+    kanji_pool, kana_pool, meaning_pool = build_pools(entries)
+    print(
+        f"Pools: kanji={len(kanji_pool)}, kana={len(kana_pool)}, meaning={len(meaning_pool)}"
+    )
+
+    questions, skipped = generate_all_questions(
+        entries, kanji_pool, kana_pool, meaning_pool, rng=rng
+    )
+    print(f"Generated {len(questions)} questions (skipped {skipped})")
+
+    conn = create_db(args.db, force=args.force)
+    try:
+        ids = insert_entries(conn, entries)
+        count = insert_questions(conn, questions, ids)
+        finalize_db(conn)
+        print(f"Inserted {len(ids)} entries and {count} questions into {args.db}")
+        if args.show_sample:
+            rows = conn.execute(
+                "SELECT id, entry_id, q_type, prompt, options, correct_index FROM questions ORDER BY id LIMIT 10"
+            ).fetchall()
+            for row in rows:
+                opts = json.loads(row[4] or "[]")
+                print(f"Q#{row[0]} entry={row[1]} type={row[2]} prompt={row[3]}")
+                for i, o in enumerate(opts):
+                    mark = "(correct)" if i == row[5] else ""
+                    print(f"  {i + 1}. {o} {mark}")
+                print()
+    finally:
+        conn.close()
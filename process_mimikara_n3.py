@@ -0,0 +1,478 @@
+"""
+process_mimikara_n3.py
+
+End-to-end pipeline for the mimikara vocabulary lists:
+- Parse the raw export (mimikara_n3.txt) with its chapter blocks
+  ("{Bài Bài 1:" ... "}") and comma separated lines "kanji, kana, meaning,"
+- Normalize the fields (drop 'nan' placeholders, blank out a "kanji" column
+  that is really just kana)
+- Write the numbered fixed file (mimikara_n3_numbered_fixed.txt) with a
+  level header and "{...}" chapter blocks
+- Run the question generation from `convert_kana_entries` into an SQLite DB
+- Apply the level and chapter numbers back onto the entries/questions tables
+  and seed the n_level lookup table
+
+Run `python process_mimikara_n3.py --force` from the project root to rebuild
+the DB from scratch.
+"""
+from __future__ import annotations
+
+import argparse
+import array
+import csv
+import json
+import random
+import re
+import sqlite3
+from pathlib import Path
+from types import MappingProxyType
+from typing import List, Optional, Tuple
+
+import convert_kana_entries as cke
+
+# prefer google-re2 for the chapter scan when available; falls back to
+# the stdlib re module when the dependency is absent
+try:
+    import re2 as _re
+except ImportError:
+    _re = re
+
+# raw files up to this size are decoded in one go; larger ones stream
+_READ_ALL_THRESHOLD = 64 * 1024 * 1024
+
+# the kana-only test is a pure character-class membership check, so a
+# str.translate deletion table beats any regex engine on short fields:
+# the hiragana/katakana blocks plus everything re's \s class accepts
+_KANA_CHARS = (
+    "".join(map(chr, (*range(0x3040, 0x3100), *range(0x31F0, 0x3200))))
+    + "\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f \x85\xa0\u1680"
+    + "".join(map(chr, range(0x2000, 0x200B)))
+    + "\u2028\u2029\u202f\u205f\u3000"
+)
+_KANA_DEL = str.maketrans("", "", _KANA_CHARS)
+
+# shared statement text for the chapter backfill, so both apply paths
+# hit the sqlite3 module's statement cache with the same prepared SQL
+_UPDATE_ENTRY_CHAPTER_SQL = "UPDATE entries SET chapter=? WHERE id=?"
+
+# level header -> n_level id, immutable so callers can't mutate it
+_LEVEL_MAP = MappingProxyType({"n5": 1, "n4": 2, "n3": 3, "n2": 4, "n1": 5})
+
+# constant seed rows for the n_level lookup table
+_N_LEVEL_SEED = ((1, "n5"), (2, "n4"), (3, "n3"), (4, "n2"), (5, "n1"))
+
+# chapter parsing: one combined pattern finds the braces and the leading
+# entry numbers in a single pass over the whole file
+_CHAPTER_SCAN_RE = _re.compile(r"\{|\}|^\s*(\d+)\.", _re.M)
+
+
+def _is_kana_only(s: str) -> bool:
+    """Return True if `s` consists only of hiragana/katakana (plus spacing).
+
+    Used to detect rows where the "kanji" column is actually just the kana
+    reading repeated (or a katakana word with no kanji form).
+    """
+    s2 = s.strip()
+    return bool(s2) and not s2.translate(_KANA_DEL)
+
+
+def parse_raw_file(path: Path) -> Tuple[List[Tuple[str, str, str]], List[int]]:
+    """Parse the raw chapter file.
+
+    Returns (entries, chapter_starts): `entries` is a list of
+    (kanji, kana, meaning) tuples, `chapter_starts` holds the 1-based entry
+    index at which each chapter begins. A numbered "{Bài Bài N:" header
+    opens a new chapter; a plain "{Bài:" block continues the current one.
+    """
+    if not path.exists():
+        raise FileNotFoundError(f"Raw file not found: {path}")
+
+    entries: List[Tuple[str, str, str]] = []
+    chapter_starts: List[int] = []
+    # decode the whole file in one pass through the C codec when it fits
+    # in memory; huge files fall back to streaming line iteration
+    fh = None
+    if path.stat().st_size <= _READ_ALL_THRESHOLD:
+        line_source = path.read_text(encoding="utf-8").splitlines()
+    else:
+        fh = path.open("r", encoding="utf-8", newline="")
+        line_source = fh
+    try:
+        # csv.reader tokenizes the comma-separated fields in C; the raw
+        # export never quotes, so QUOTE_NONE splits exactly like str.split
+        for row in csv.reader(line_source, quoting=csv.QUOTE_NONE):
+            if not row:
+                continue
+            first = row[0].strip()
+            if not first and len(row) == 1:
+                continue
+            if first.startswith("{"):
+                line = ",".join(row)
+                if "Bài Bài" in line or not chapter_starts:
+                    chapter_starts.append(len(entries) + 1)
+                continue
+            if first.startswith("}"):
+                continue
+            # the meaning may contain commas itself, so rejoin the tail
+            kanji = first
+            kana = row[1].strip() if len(row) > 1 else ""
+            meaning = ",".join(row[2:]).strip() if len(row) > 2 else ""
+            # every exported line ends with a separator comma
+            if meaning.endswith(","):
+                meaning = meaning[:-1].strip()
+            # the export writes a literal 'nan' for the missing third cell
+            # on two-column rows ("word, meaning, nan"); when the word is
+            # kana-only it has no kanji form, so shift the columns
+            if meaning.lower() == "nan" and _is_kana_only(kanji):
+                kanji, kana, meaning = "", kanji, kana
+            elif kana.lower() == "nan" and _is_kana_only(kanji):
+                kanji, kana = "", kanji
+            entries.append((kanji, kana, meaning))
+    finally:
+        if fh is not None:
+            fh.close()
+    return entries, chapter_starts
+
+
+def write_fixed_file(
+    entries: List[Tuple[str, str, str]],
+    chapter_starts: List[int],
+    level: str,
+    path: Path,
+) -> None:
+    """Write the numbered fixed file: a level header ("n3") followed by
+    "{...}" chapter blocks of globally numbered entries.
+    """
+    starts = set(chapter_starts)
+    # assemble everything in memory and write once: one buffered write
+    # instead of a Python-level fh.write call per entry
+    parts = [f"{level}\n"]
+    append = parts.append
+    for i, (kanji, kana, meaning) in enumerate(entries, 1):
+        if i in starts:
+            if i != 1:
+                append("}\n")
+            append("{\n")
+        append(f"{i}.   {kanji.strip()}, {kana.strip()}, {meaning.strip()}\n")
+    if entries:
+        append("}\n")
+    with path.open("w", encoding="utf-8") as fh:
+        fh.write("".join(parts))
+
+
+def _scan_chapters(text: str) -> array.array:
+    """Chapter index per entry id from the "{...}" blocks in `text`.
+
+    Entry ids are a dense 1..N range, so the result is a flat int array
+    indexed by entry id (slot 0 unused, 0 meaning "no chapter"): no
+    hashing on build, and iteration is a plain enumerate.
+    """
+    chapters = array.array("i", (0,))
+    chapter_idx = 0
+    inside = False
+    for m in _CHAPTER_SCAN_RE.finditer(text):
+        num = m.group(1)
+        if num is not None:
+            if inside:
+                entry_id = int(num)
+                if entry_id >= len(chapters):
+                    chapters.extend([0] * (entry_id + 1 - len(chapters)))
+                chapters[entry_id] = chapter_idx
+        elif m.group(0) == "{":
+            chapter_idx += 1
+            inside = True
+        else:
+            inside = False
+    return chapters
+
+
+def parse_chapters_from_fixed(path: Path) -> array.array:
+    """Chapter index per entry id from the fixed file's {} blocks."""
+    return _scan_chapters(path.read_text(encoding="utf-8"))
+
+
+def read_level_from_txt(path: Path) -> str:
+    """Read the level header ("n1".."n5") from the first non-empty line."""
+    for raw in path.read_text(encoding="utf-8").splitlines():
+        line = raw.strip().lower()
+        if not line:
+            continue
+        if line in _LEVEL_MAP:
+            return line
+        break
+    raise ValueError(f"No level header (n1..n5) found in {path}")
+
+
+def _tune_connection(conn: sqlite3.Connection, unsafe: bool = False) -> None:
+    """Set write-friendly PRAGMAs for the bulk update phase.
+
+    WAL + NORMAL sync drop most of the per-commit fsync cost; `unsafe`
+    turns syncing off entirely, acceptable only because the DB can be
+    regenerated from the text files at any time.
+    """
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF" if unsafe else "PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-65536")
+    # no FK constraints in this schema, but make sure enforcement can't
+    # tax the bulk updates if a caller's connection enabled it
+    conn.execute("PRAGMA foreign_keys=OFF")
+
+
+def _ensure_columns(
+    conn: sqlite3.Connection, table: str, columns: Tuple[str, ...] = ("level", "chapter")
+) -> None:
+    """Add INTEGER `columns` to `table` if this DB predates them."""
+    cur = conn.cursor()
+    cur.execute(f"PRAGMA table_info({table})")
+    cols = {row[1] for row in cur.fetchall()}
+    for col in columns:
+        if col not in cols:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {col} INTEGER")
+    conn.commit()
+
+
+def apply_chapters(
+    db_path: Path, txt_path: Path, level: Optional[str] = None, unsafe: bool = False
+) -> int:
+    """Apply chapter numbers parsed from `txt_path` onto an existing DB.
+
+    Standalone entry point (``--chapters-only``) for re-running the chapter
+    backfill without regenerating the DB. Optionally also stamps `level`.
+    Returns the number of entry rows updated.
+    """
+    # pure input validation: reject a bad level before any DB work so a
+    # caught ValueError never leaves an open write transaction behind
+    if level is not None and level not in _LEVEL_MAP:
+        raise ValueError(
+            f"Unknown level {level!r}, expected one of {sorted(_LEVEL_MAP)}"
+        )
+
+    chapters = _scan_chapters(txt_path.read_text(encoding="utf-8"))
+
+    # isolation_level=None disables the DB-API layer's implicit BEGIN /
+    # commit pairing; the whole backfill runs under one explicit
+    # transaction and therefore one WAL commit record
+    conn = sqlite3.connect(str(db_path), isolation_level=None)
+    _tune_connection(conn, unsafe)
+    cur = conn.cursor()
+    _ensure_columns(conn, "entries")
+    _ensure_columns(conn, "questions")
+
+    cur.execute("BEGIN IMMEDIATE")
+    # the (level, chapter) index would be maintained row-by-row through
+    # the backfill; cheaper to drop it and rebuild with one sort at the end
+    cur.execute("DROP INDEX IF EXISTS idx_questions_level_chapter")
+    cur.executemany(
+        "INSERT OR REPLACE INTO n_level (id, level) VALUES (?, ?)", _N_LEVEL_SEED
+    )
+
+    if level is not None:
+        # only touch rows whose level actually changes, so re-runs don't
+        # rewrite (and re-journal) every page of both tables
+        lid = _LEVEL_MAP[level]
+        cur.execute(
+            "UPDATE entries SET level=? WHERE level IS NULL OR level<>?", (lid, lid)
+        )
+        cur.execute(
+            "UPDATE questions SET level=? WHERE level IS NULL OR level<>?", (lid, lid)
+        )
+
+    # one executemany: a single statement parse instead of one per entry
+    cur.executemany(
+        _UPDATE_ENTRY_CHAPTER_SQL,
+        [(c, entry_id) for entry_id, c in enumerate(chapters) if c],
+    )
+    updated = cur.rowcount
+
+    # indexed UPDATE..FROM join instead of a correlated subquery per row;
+    # the predicate skips rewriting pages whose chapter is already right
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_questions_entry_id ON questions(entry_id)"
+    )
+    cur.execute(
+        "UPDATE questions SET chapter = entries.chapter FROM entries"
+        " WHERE entries.id = questions.entry_id"
+        " AND (questions.chapter IS NULL OR questions.chapter <> entries.chapter)"
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_questions_level_chapter"
+        " ON questions(level, chapter)"
+    )
+    cur.execute("COMMIT")
+    conn.close()
+    return updated
+
+
+def apply_level_and_chapters_from_txt(
+    db_path: Path, txt_path: Path, unsafe: bool = False
+) -> None:
+    """Read the level header and chapter blocks from the fixed file and
+    write them onto the entries/questions tables (seeding n_level too).
+    """
+    level = read_level_from_txt(txt_path)
+    level_id = _LEVEL_MAP[level]
+    entry_chapters = parse_chapters_from_fixed(txt_path)
+    chapter_params = [(c, entry_id) for entry_id, c in enumerate(entry_chapters) if c]
+
+    conn = sqlite3.connect(str(db_path), isolation_level=None)
+    _tune_connection(conn, unsafe)
+    cur = conn.cursor()
+    _ensure_columns(conn, "entries")
+    _ensure_columns(conn, "questions")
+
+    # one explicit transaction around the whole backfill: a single WAL
+    # flush, no implicit DB-API auto-begin, and the DB never shows a
+    # half-applied state
+    cur.execute("BEGIN IMMEDIATE")
+    # the (level, chapter) index would be maintained row-by-row through
+    # the backfill; cheaper to drop it and rebuild with one sort at the end
+    cur.execute("DROP INDEX IF EXISTS idx_questions_level_chapter")
+    cur.executemany(
+        "INSERT OR REPLACE INTO n_level (id, level) VALUES (?, ?)", _N_LEVEL_SEED
+    )
+
+    cur.execute(
+        "UPDATE entries SET level=? WHERE level IS NULL OR level<>?",
+        (level_id, level_id),
+    )
+    cur.execute(
+        "UPDATE questions SET level=? WHERE level IS NULL OR level<>?",
+        (level_id, level_id),
+    )
+
+    cur.executemany(_UPDATE_ENTRY_CHAPTER_SQL, chapter_params)
+
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_questions_entry_id ON questions(entry_id)"
+    )
+    cur.execute(
+        "UPDATE questions SET chapter = entries.chapter FROM entries"
+        " WHERE entries.id = questions.entry_id"
+        " AND (questions.chapter IS NULL OR questions.chapter <> entries.chapter)"
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_questions_level_chapter"
+        " ON questions(level, chapter)"
+    )
+    cur.execute("COMMIT")
+    conn.close()
+    print(
+        f"Applied level={level} and {len(chapter_params)} chapter mappings to {db_path}"
+    )
+
+
+def run_generation(
+    fixed_path: Path,
+    db_path: Path,
+    force: bool = False,
+    seed: Optional[int] = None,
+    show_sample: bool = False,
+    entries: Optional[List[Tuple[str, str, str]]] = None,
+) -> None:
+    """Generate entries and questions into `db_path`.
+
+    When the caller already holds the parsed entries (as `main` does
+    right after `parse_raw_file`), pass them in to skip the write/re-read
+    round-trip through the fixed file; otherwise they are parsed from
+    `fixed_path`.
+    """
+    # a private Random instead of seeding the process-global state, so
+    # parallel per-level runs would each get an independent stream
+    rng = random.Random(seed)
+
+    if entries is None:
+        entries = cke.parse_fixed_file(fixed_path)
+        print(f"Parsed {len(entries)} entries from {fixed_path}")
+
+    kanji_pool, kana_pool, meaning_pool = cke.build_pools(entries)
+    questions, skipped = cke.generate_all_questions(
+        entries, kanji_pool, kana_pool, meaning_pool, rng=rng
+    )
+    print(f"Generated {len(questions)} questions (skipped {skipped})")
+
+    conn = cke.create_db(db_path, force=force)
+    try:
+        ids = cke.insert_entries(conn, entries)
+        count = cke.insert_questions(conn, questions, ids)
+        cke.finalize_db(conn)
+        print(f"Inserted {len(ids)} entries and {count} questions into {db_path}")
+    finally:
+        conn.close()
+
+    if show_sample:
+        conn = sqlite3.connect(str(db_path))
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT id, q_type, prompt, options, correct_index FROM questions ORDER BY id LIMIT 5"
+        )
+        for row in cur.fetchall():
+            opts = json.loads(row[3] or "[]")
+            print(f"Q#{row[0]} type={row[1]} prompt={row[2]}")
+            for i, o in enumerate(opts):
+                mark = "(correct)" if i == row[4] else ""
+                print(f"  {i + 1}. {o} {mark}")
+        conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Convert the raw mimikara list into a fixed numbered file and question DB."
+    )
+    parser.add_argument(
+        "--raw", type=Path, default=Path("mimikara_n3.txt"), help="Raw input file"
+    )
+    parser.add_argument(
+        "--fixed",
+        type=Path,
+        default=Path("mimikara_n3_numbered_fixed.txt"),
+        help="Numbered fixed file to write",
+    )
+    parser.add_argument(
+        "--db",
+        type=Path,
+        default=Path("mimikara_n3_questions.db"),
+        help="Output DB file",
+    )
+    parser.add_argument(
+        "--level", default="n3", help="JLPT level header for the fixed file"
+    )
+    parser.add_argument("--force", action="store_true", help="Overwrite DB if exists")
+    parser.add_argument(
+        "--fast-unsafe",
+        action="store_true",
+        help="Disable SQLite syncing during the level/chapter backfill "
+        "(fine for a DB that is regenerated from the text files)",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=None, help="Random seed for distractors"
+    )
+    parser.add_argument(
+        "--show-sample",
+        action="store_true",
+        help="Print a few sample questions after generation",
+    )
+    args = parser.parse_args()
+
+    entries, chapter_starts = parse_raw_file(args.raw)
+    print(
+        f"Parsed {len(entries)} entries ({len(chapter_starts)} chapters) from {args.raw}"
+    )
+    write_fixed_file(entries, chapter_starts, args.level, args.fixed)
+    print(f"Wrote fixed file {args.fixed}")
+
+    # the fixed file is still written above as the chapter/level source
+    # and debug artifact, but generation reuses the in-memory entries
+    run_generation(
+        args.fixed,
+        args.db,
+        force=args.force,
+        seed=args.seed,
+        show_sample=args.show_sample,
+        entries=entries,
+    )
+    apply_level_and_chapters_from_txt(args.db, args.fixed, unsafe=args.fast_unsafe)
+
+
+if __name__ == "__main__":
+    main()